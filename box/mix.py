@@ -469,6 +469,9 @@ def broaden(x,y=None,width=0.05,function='gaussian',extend=False,N=200,a=None,b=
     -----------
     x:         data points (~energy axis)
     y:         heights of the peaks given with x. Default is one for all.
+               If y has more dimensions, the first axis goes with x and
+               all the remaining distributions are broadened at once
+               (the result then has shape y.shape[1:]+(N,)).
     width:     width parameter specific for given broadening function.
     function:  'gaussian' or 'lorentzian'
     extend:    if True, extend xrange bit beyond min(x) and max(x) (unless [a,b] given)
@@ -496,13 +499,13 @@ def broaden(x,y=None,width=0.05,function='gaussian',extend=False,N=200,a=None,b=
     else:
         xgrid = np.linspace(mn,mx,N)
 
-    ybroad= np.zeros_like(xgrid)
+    ybroad= np.zeros(np.shape(y)[1:]+np.shape(xgrid))
     for xi,yi in zip(x,y):
         if function=='lorentzian':
             w = (width/np.pi)/((xgrid-xi)**2+width**2)
         elif function=='gaussian':
             w = np.exp( -(xgrid-xi)**2/(2*width**2) ) / (np.sqrt(2*np.pi)*width)
-        ybroad = ybroad + yi*w
+        ybroad = ybroad + np.multiply.outer(yi,w)
     return xgrid, ybroad
 
 
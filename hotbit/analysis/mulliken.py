@@ -12,7 +12,7 @@ def get_angular_momenta(l):
 
 
 class MullikenAnalysis:
-    def __init__(self, calc):
+    def __init__(self, calc, dtype=None):
         """
         Class for Mulliken charge analysis.
         
@@ -31,8 +31,18 @@ class MullikenAnalysis:
                    = wk * f(k,a) * aux(k,a,mu)   
                
             where aux(k,a,mu) = Re [wf(k,a,mu)*sum_nu wf(k,a,nu)*S(k,mu,nu)]     
+            
+        aux is not stored, but evaluated on demand only for the
+        k-points, eigenstates and orbitals asked for.
         
         All the units are, also inside the class, in eV and Angstroms. 
+        
+        parameters:
+        ===========
+        calc:     calculator with solved electronic structure
+        dtype:    complex type for the matrices used in the analysis.
+                  None uses the precision of the calculation; np.complex64
+                  halves memory and bandwidth, at ~1E-6 accuracy.
         """
         self.calc = proxy(calc)
         st = self.calc.st
@@ -43,23 +53,53 @@ class MullikenAnalysis:
         norb = self.calc.st.norb
         self.norb = norb
         
-        self.diag = np.zeros((norb))        
-        for k in range(self.nk):
-            diag_k = ( st.rho[k]*st.S[k].transpose() ).sum(axis=1).real
-            self.diag += self.wk[k]*diag_k
-            
-        self.aux = np.zeros((self.nk,norb,norb))
-        wf = st.wf.copy()
-        wfc = st.wf.copy().conjugate()
-        for k in range(self.nk):
-            for a in range(norb):
-                self.aux[k,a] = ( wfc[k,a] * np.dot(wf[k,a],st.S[k].transpose()) ).real 
+        # work with the calculator's arrays directly unless a cast is asked for
+        if dtype is None:
+            dtype = st.wf.dtype
+        self.dtype = np.dtype(dtype)
+        if not np.issubdtype(self.dtype,np.complexfloating):
+            raise ValueError('Mulliken analysis requires a complex dtype, got %s.' %self.dtype)
+        self.wf = st.wf.astype(self.dtype,copy=False)
+        self.S = st.S.astype(self.dtype,copy=False)
+        self.rho = st.rho.astype(self.dtype,copy=False)
+        # tolerance for the imaginary parts of real quantities
+        if self.dtype.itemsize<=8:
+            self.tol_imaginary = 1E-6
+        else:
+            self.tol_imaginary = 1E-12
+        
+        self.diag = np.einsum('k,kij,kji->i',self.wk,self.rho,self.S,optimize=True).real
+        # atoms' orbital indices and (first orbital, number of orbitals)
+        self._orb_indices = [np.asarray(self.calc.el.orbitals(i,indices=True),dtype=np.intp) for i in range(self.N)]
+        self._o1_no = self.calc.el.get_property_lists(['o1','no'])
+        # orbital indices for angular momenta 0,1 and 2
+        lorbs = [[],[],[]]
+        for m,orb in enumerate(self.calc.el.orbitals()):
+            lorbs[orb['angmom']].append(m)
+        self._lorbs = [np.asarray(l,dtype=np.intp) for l in lorbs]
+        # first orbitals of atoms, for summing orbital quantities atom-wise
+        self._atom_offsets = np.array([o1 for o1,no in self._o1_no])
+
+
+    def _aux(self,k,a,orbs=slice(None)):
+        """
+        Return aux(k,a,mu) for orbitals mu in orbs.
+        
+        parameters:
+        ===========
+        k:      k-vector index
+        a:      eigenstate index or an array of eigenstate indices
+        orbs:   orbital index, list of orbital indices or slice
+        """
+        wf = self.wf[k,a]
+        S = self.S[k][orbs]
+        return ( wf[...,orbs].conjugate() * np.dot(wf,S.transpose()) ).real
 
 
     def trace_I(self,I,matrix):
         """ Return partial trace over atom I's orbitals. """
         ret = 0.0
-        I = self.calc.el.orbitals(I,indices=True)
+        I = self._orb_indices[I]
         for i in I:
             ret += matrix[i,i]
         return ret
@@ -67,10 +107,8 @@ class MullikenAnalysis:
 
     def get_atoms_mulliken(self):
         """ Return Mulliken populations. """
-        q = []
-        for o1, no in self.calc.el.get_property_lists(['o1','no']):
-            q.append( self.diag[o1:o1+no].sum() )
-        return np.array(q)-self.calc.el.get_valences()
+        q = np.add.reduceat(self.diag,self._atom_offsets)
+        return q-self.calc.el.get_valences()
 
 
     def get_atom_mulliken(self, I):
@@ -81,7 +119,7 @@ class MullikenAnalysis:
         ===========
         I:        atom index
         """
-        orbs = self.calc.el.orbitals(I,indices=True)
+        orbs = self._orb_indices[I]
         return sum( self.diag[orbs] )
 
 
@@ -99,7 +137,7 @@ class MullikenAnalysis:
     def get_atom_all_angmom_mulliken(self,I):
         """ Return the Mulliken population of atom I from eigenstate a, for all angmom."""
         
-        orbs = self.calc.el.orbitals(I,indices=True)
+        orbs = self._orb_indices[I]
         all = self.diag[orbs]
         pop = np.zeros((3,))
         pop[0] = all[0]
@@ -121,7 +159,7 @@ class MullikenAnalysis:
         """
         w = 1.0
         if wk: w = self.wk[k]
-        return w*self.aux[k,a,mu]
+        return w*self._aux(k,a,mu)
 
 
     def get_atom_wf_mulliken(self,I,k,a,wk=True):
@@ -138,9 +176,9 @@ class MullikenAnalysis:
         w = 1.0
         if wk: w = self.wk[k]
         if I==None:
-            return np.array( [self.get_atom_wf_mulliken(i,k,a,wk) for i in range(self.N)] )
-        orbs = self.calc.el.orbitals(I,indices=True)
-        return w*self.aux[k,a,orbs].sum()
+            return w*np.add.reduceat(self._aux(k,a),self._atom_offsets)
+        orbs = self._orb_indices[I]
+        return w*self._aux(k,a,orbs).sum()
 
 
     def get_atom_wf_all_orbital_mulliken(self,I,k,a,wk=True):
@@ -156,11 +194,8 @@ class MullikenAnalysis:
         """
         w = 1.0
         if wk: w = self.wk[k]
-        orbs = self.calc.el.orbitals(I,indices=True)
-        q = []
-        for mu in orbs:
-            q.append( w*self.aux[k,a,mu] )
-        return np.array(q)
+        orbs = self._orb_indices[I]
+        return w*self._aux(k,a,orbs)
 
 
     def get_atom_wf_all_angmom_mulliken(self,I,k,a,wk=True):
@@ -186,14 +221,14 @@ class MullikenAnalysis:
 
 
 class DensityOfStates(MullikenAnalysis):
-    def __init__(self, calc):
+    def __init__(self, calc, dtype=None):
         """ 
         A class that calculates different kinds of local and projected
         density of states using the Mulliken charges. 
         
         Units also inside this class are in eV
         """
-        MullikenAnalysis.__init__(self, calc)
+        MullikenAnalysis.__init__(self, calc, dtype)
 
         self.e = self.calc.st.get_eigenvalues()*Hartree
         self.e -= self.calc.get_fermi_level()
@@ -238,14 +273,10 @@ class DensityOfStates(MullikenAnalysis):
         if window is not None:
             mn, mx = window
             
-        x, y, f = [],[],[]
-        for a in range(self.calc.el.norb):
-            x = np.concatenate( (x,self.e[:,a]) )
-            y = np.concatenate( (y,self.calc.st.wk) )
-            f = np.concatenate( (f,self.calc.st.f[:,a]) )
-        x=np.array(x) 
-        y=np.array(y) 
-        f=np.array(f)
+        # all states, ordered eigenstate by eigenstate
+        x = self.e.transpose().reshape(-1)
+        y = np.tile(self.calc.st.wk,self.norb)
+        f = self.calc.st.f.transpose().reshape(-1)
         if broaden:
             e,dos = mix.broaden(x, y, width=width, N=npts, a=mn, b=mx)
         else:
@@ -281,24 +312,39 @@ class DensityOfStates(MullikenAnalysis):
             mn, mx = window
                    
         # only states within window 
-        kl,al,el = [],[],[]        
-        for k in range(self.nk):
-            for a in range(self.norb):
-                if mn<=self.e[k,a]<=mx:
-                    kl.append(k)
-                    al.append(a)
-                    el.append(self.e[k,a]) 
-                
-        ldos = np.zeros((self.N,npts))
+        kl, al = np.where( (mn<=self.e) & (self.e<=mx) )
+        el = self.e[kl,al]
+        
         if projected:
-            pldos = np.zeros((self.N,3,npts))
-        for i in range(self.N):
-            q = [ self.get_atom_wf_mulliken(i,k,a,wk=True) for k,a in zip(kl,al) ]
-            egrid, ldos[i,:] = mix.broaden( el,q,width=width,N=npts,a=mn,b=mx )
+            o1, no = np.array(self._o1_no).transpose()
+            # s-, p- and d-populations; segments start at
+            # orbitals o1, o1+1 and o1+4 (if atom has them)
+            starts, atoms, ls = [], [], []
+            for i in range(self.N):
+                for l,start in enumerate([0,1,4]):
+                    if start<no[i]:
+                        starts.append(o1[i]+start)
+                        atoms.append(i)
+                        ls.append(l)
+            ql = np.zeros((len(kl),self.N,3))
+            
+        # orbital populations of the states, evaluated k-point by k-point
+        # and summed over each atom's orbitals (and angular momenta) right away
+        q = np.zeros((len(kl),self.N))
+        for k in range(self.nk):
+            sel = kl==k
+            # reduce in double precision also for single precision aux
+            aux = self.wk[k]*self._aux(k,al[sel]).astype(float)
+            q[sel] = np.add.reduceat(aux,self._atom_offsets,axis=1)
             if projected:
-                q = np.array( [self.get_atom_wf_all_angmom_mulliken(i,k,a,wk=True) for k,a in zip(kl,al)] )
-                for l in range(3):
-                    egrid, pldos[i,l] = mix.broaden( el,q[:,l],width=width,N=npts,a=mn,b=mx )
+                ql_k = np.zeros((len(aux),self.N,3))
+                ql_k[:,atoms,ls] = np.add.reduceat(aux,starts,axis=1)
+                ql[sel] = ql_k
+
+        # broaden all atoms (and angular momenta) in one pass over the states
+        egrid, ldos = mix.broaden( el,q,width=width,N=npts,a=mn,b=mx )
+        if projected:
+            egrid, pldos = mix.broaden( el,ql,width=width,N=npts,a=mn,b=mx )
             
         if projected:
             assert np.all( abs(ldos-pldos.sum(axis=1))<1E-6 )
@@ -311,34 +357,56 @@ class DensityOfStates(MullikenAnalysis):
 
 class MullikenBondAnalysis(MullikenAnalysis):    
     
-    def __init__(self, calc):
+    def __init__(self, calc, dtype=None):
         """ 
         Class for bonding analysis using Mulliken charges. 
         """        
-        MullikenAnalysis.__init__(self, calc)
-        rhoSk = []
-        HS = []
-        rhoM = []
-        n=self.st.norb
+        MullikenAnalysis.__init__(self, calc, dtype)
         epsilon = []
         for mu in range(self.norb):
             epsilon.append( self.calc.el.orbitals(mu,basis=True)['energy'] )
         epsilon = np.array(epsilon)
         #epsilon-bar matrix of Bornsen et al J.Phys.:Cond.mat 11, L287 (1999)
-        aux = epsilon.repeat(n).reshape(n,n)
-        eps = 0.5*(aux+aux.transpose())   
-        for k in range(self.nk):
-            rhoSk.append( np.dot(self.st.rho[k],self.st.S[k]) )
-            HS.append( self.st.H0[k] - self.st.S[k]*eps )
-            rhoM.append( self.st.rho[k]*((self.st.H0[k]-self.st.S[k]*eps).transpose()) ) 
-        self.rhoSk = np.array(rhoSk)
-        self.rhoM = np.array(rhoM)
-        self.HS = np.array(HS)
+        eps = 0.5*np.add.outer(epsilon,epsilon)
+        eps = eps.astype(self.S.real.dtype)
+        H0 = self.st.H0.astype(self.dtype,copy=False)
+        # batched over k-points
+        if self.calc.get('gpu'):
+            try:
+                import cupy as cp
+            except ImportError:
+                raise ImportError('Bonding analysis with gpu=True requires CuPy.')
+            rho, S = cp.asarray(self.rho), cp.asarray(self.S)
+            HS = cp.asarray(H0) - S*cp.asarray(eps)[None,:,:]
+            self.rhoSk = cp.matmul(rho,S).get()
+            self.HS = HS.get()
+            self.rhoM = (rho*HS.transpose((0,2,1))).get()
+        else:
+            self.rhoSk = np.matmul(self.rho,self.S)
+            self.HS = H0 - self.S*eps[None,:,:]
+            self.rhoM = self.rho*self.HS.transpose((0,2,1))
+        # sum_k w_k rhoM(k), summed over the orbital blocks of all atom pairs
+        o = self._atom_offsets
+        rhoM = np.einsum('k,kmn->mn',self.wk,self.rhoM,optimize=True)
+        self._rhoM_blocks = np.add.reduceat(np.add.reduceat(rhoM,o,axis=0),o,axis=1)
         self.epsilon = np.array(epsilon)
         self.SCC = self.calc.get('SCC')
+        self._paths = {}
+        
         
+    def _einsum(self,key,subscripts,*operands):
+        """ 
+        Return np.einsum(subscripts,*operands).
         
-    def get_mayer_bond_order(self,i,j):
+        The optimal contraction path is searched only once for each key;
+        operands with the same key should have the same shapes.
+        """
+        if key not in self._paths:
+            self._paths[key] = np.einsum_path(subscripts,*operands,optimize='optimal')[0]
+        return np.einsum(subscripts,*operands,optimize=self._paths[key])
+        
+        
+    def get_mayer_bond_order(self,i,j,check_imaginary=True):
         """
         Return Mayer bond-order between two atoms.
         
@@ -347,19 +415,43 @@ class MullikenBondAnalysis(MullikenAnalysis):
         
         parameters:
         ===========
-        I:        first atom index
-        J:        second atom index
+        I:               first atom index
+        J:               second atom index
+        check_imaginary: assert that the imaginary part is negligible;
+                         if False, the imaginary part is discarded
         """
         assert type(i)==int and type(j)==int
-        orbi = self.calc.el.orbitals(i, indices=True)
-        orbj = self.calc.el.orbitals(j, indices=True)
+        orbi = self._orb_indices[i]
+        orbj = self._orb_indices[j]
+        
+        # M = sum_k w_k sum_(mu in i) sum_(nu in j) rhoS(k)_(mu,nu)*rhoS(k)_(nu,mu)
+        A = self.rhoSk[:,orbi][:,:,orbj]
+        B = self.rhoSk[:,orbj][:,:,orbi]
+        M = np.einsum('k,kij,kji->',self.wk,A,B,optimize=True)
+        if check_imaginary:
+            assert abs(M.imag)<self.tol_imaginary
+        return M.real
+
+
+    def get_mayer_bond_order_matrix(self,check_imaginary=True):
+        """
+        Return Mayer bond-orders between all atom pairs.
         
-        M = 0.0
-        for k in range(self.nk):
-            for mu in orbi:
-                for nu in orbj:
-                    M += self.wk[k] * self.rhoSk[k,mu,nu]*self.rhoSk[k,nu,mu]
-        assert abs(M.imag)<1E-12
+        Warning: appears to work only with periodic systems
+        where orbitals have no overlap with own images.
+        
+        parameters:
+        ===========
+        check_imaginary: assert that the imaginary parts of all elements
+                         are negligible; if False, they are discarded
+        
+        return:   array M[i,j] = get_mayer_bond_order(i,j,check_imaginary)
+        """
+        o = self._atom_offsets
+        M = np.einsum('k,kmn,knm->mn',self.wk,self.rhoSk,self.rhoSk,optimize=True)
+        M = np.add.reduceat(np.add.reduceat(M,o,axis=0),o,axis=1)
+        if check_imaginary:
+            assert np.all( abs(M.imag)<self.tol_imaginary )
         return M.real
 
 
@@ -376,25 +468,26 @@ class MullikenBondAnalysis(MullikenAnalysis):
                    as an array.
         """
         if I==None:
-            return np.array( [self.get_atom_energy(i) for i in range(self.N)] )
+            atoms = np.arange(self.N)
+        else:
+            atoms = np.array([I])
             
         if self.SCC:
-            coul = 0.5*self.calc.st.es.G[I,I]*self.st.dq[I]**2
+            coul = 0.5*self.calc.st.es.G[atoms,atoms]*self.st.dq[atoms]**2
         else:
             coul = 0.0         
         
-        elm = self.calc.el.elements[self.calc.el.symbols[I]]
-        o1, no = self.calc.el.get_property_lists(['o1','no'])[I]
+        eorb = self._rhoM_blocks[atoms,atoms]
         
-        eorb = 0.0
-        for k,wk in enumerate(self.wk):
-            eorb += wk*np.sum( self.rhoM[k,o1:o1+no,o1:o1+no] )
-        
-        erep = self.calc.rep.get_pair_repulsive_energy(I,I) #self-repulsion for pbc
-        epp = self.calc.pp.get_pair_energy(I,I) #self-energy from pair potentials
-        A = (coul + erep + epp + eorb )*Hartree + self.get_promotion_energy(I) 
-        assert abs(A.imag)<1E-12
-        return A.real
+        erep = np.array( [self.calc.rep.get_pair_repulsive_energy(i,i) for i in atoms] ) #self-repulsion for pbc
+        epp = np.array( [self.calc.pp.get_pair_energy(i,i) for i in atoms] ) #self-energy from pair potentials
+        eprom = np.array( [self.get_promotion_energy(i) for i in atoms] )
+        A = (coul + erep + epp + eorb )*Hartree + eprom 
+        assert np.all( abs(A.imag)<self.tol_imaginary )
+        if I==None:
+            return A.real
+        else:
+            return A[0].real
 
 
     def get_promotion_energy(self, I=None):
@@ -413,13 +506,13 @@ class MullikenBondAnalysis(MullikenAnalysis):
             return np.array( [self.get_promotion_energy(i) for i in range(self.N)] )
             
         e = 0.0
-        for mu in self.calc.el.orbitals(I, indices=True):
+        for mu in self._orb_indices[I]:
             q = self.get_basis_mulliken(mu)
             q0 = self.calc.el.get_free_population(mu)
             emu = self.calc.el.orbitals(mu,basis=True)['energy']
             e += (q-q0)*emu
             
-        assert abs(e.imag)<1E-12
+        assert abs(e.imag)<self.tol_imaginary
         return e.real * Hartree
 
 
@@ -442,14 +535,32 @@ class MullikenBondAnalysis(MullikenAnalysis):
         else:
             coul = 0.0
                 
-        o1i, noi = self.calc.el.get_property_lists(['o1','no'])[i]
-        o1j, noj = self.calc.el.get_property_lists(['o1','no'])[j]
-        ebs = 0.0
-        for k,wk in enumerate(self.wk):
-            ebs += 2*wk*np.sum( self.rhoM[k,o1i:o1i+noi,o1j:o1j+noj].real )
+        ebs = 2*self._rhoM_blocks[i,j].real
         return (rep + epp + coul + ebs) * Hartree
 
 
+    def _get_bond_energies(self,atoms):
+        """ 
+        Return bond energies (in eV) between given atoms and all atoms.
+        
+        Returns array eb[len(atoms),N] with eb[n,atoms[n]]=0.
+        """
+        atoms = np.asarray(atoms)
+        rep = np.array( [[self.calc.rep.get_pair_repulsive_energy(i,j) if i!=j else 0.0 for j in range(self.N)] for i in atoms] )
+        epp = np.array( [[self.calc.pp.get_pair_energy(i,j) if i!=j else 0.0 for j in range(self.N)] for i in atoms] )
+        
+        if self.SCC:
+            dq = self.st.dq
+            coul = self.st.es.G[atoms,:]*np.outer(dq[atoms],dq)
+        else:
+            coul = 0.0
+            
+        ebs = 2*self._rhoM_blocks[atoms,:].real
+        eb = (rep + epp + coul + ebs) * Hartree
+        eb[np.arange(len(atoms)),atoms] = 0.0
+        return eb
+
+
     def get_atom_and_bond_energy(self, i):
         """
         Return given atom's contribution to cohesion (in eV).
@@ -463,13 +574,11 @@ class MullikenBondAnalysis(MullikenAnalysis):
               as an array.
         """
         if i==None:
-            return np.array( [self.get_atom_and_bond_energy(j) for j in range(self.N)] )
-            
-        ea = self.get_atom_energy(i)
-        eb = 0.0
-        for j in range(self.N):
-            if j==i: continue
-            eb += 0.5 * self.get_bond_energy(i,j)
+            ea = self.get_atom_energy()
+            eb = 0.5 * self._get_bond_energies(range(self.N)).sum(axis=1)
+        else:
+            ea = self.get_atom_energy(i)
+            eb = 0.5 * self._get_bond_energies([i]).sum()
         return ea + eb
 
     
@@ -505,8 +614,7 @@ class MullikenBondAnalysis(MullikenAnalysis):
               Occupations are not otherwise take into account (while k-point weights are)
         """
         eps = 1E-6
-        x, y = [], []
-        wf = self.st.wf
+        wf = self.wf
         energy = self.st.e - self.st.occu.get_mu()
         if window==None:
             mn,mx = energy.flatten().min()-eps, energy.flatten().max()+eps
@@ -514,52 +622,45 @@ class MullikenBondAnalysis(MullikenAnalysis):
             mn,mx = window[0]/Hartree, window[1]/Hartree
         
         if mode=='angmom':
-            lorbs = [[],[],[]]
-            for m,orb in enumerate(self.calc.el.orbitals()):
-                lorbs[orb['angmom']].append(m)
-            oi, oj = np.array(lorbs[i]), np.array(lorbs[j])
+            oi, oj = self._lorbs[i], self._lorbs[j]
+        elif mode=='atoms':
+            o1i, noi = self._o1_no[i]
+            o1j, noj = self._o1_no[j]
+        
+        # e_ka[k,a] = sum_(m,n) wf(k,a,m)*wf(k,a,n)^* HS(k,n,m) for all states at once,
+        # where m and n run over all orbitals ('default'), over atoms i and j ('atoms'),
+        # or over orbitals with angular momenta i and j ('angmom')
+        if mode=='default':
+            # k-point by k-point; avoids conjugated copy of all wave functions
+            e_ka = np.empty((self.nk,self.norb),dtype=np.result_type(wf,self.HS))
+            for k in range(self.nk):
+                e_ka[k] = self._einsum('default','am,an,nm->a',wf[k],wf[k].conj(),self.HS[k])
         elif mode=='atoms':
-            o1i, noi = self.calc.el.get_property_lists(['o1','no'])[i]
-            o1j, noj = self.calc.el.get_property_lists(['o1','no'])[j]
+            wfi = wf[:,:,o1i:o1i+noi]
+            wfj = wf[:,:,o1j:o1j+noj]
+            HSij = self.HS[:,o1j:o1j+noj,o1i:o1i+noi]
+            e_ka = self._einsum(('atoms',noi,noj),'kam,kan,knm->ka',wfi,wfj.conj(),HSij)
+            if i!=j:
+                e_ka = 2*e_ka.real
+        elif mode=='angmom':
+            wfi = wf[:,:,oi]
+            wfj = wf[:,:,oj]
+            HSij = self.HS[:,oj][:,:,oi]
+            e_ka = self._einsum(('angmom',len(oi),len(oj)),'kam,kan,knm->ka',wfi,wfj.conj(),HSij)
+            if i!=j:
+                e_ka = e_ka + e_ka.conj()
+        elif mode=='orbitals':
+            e_ka = wf[:,:,i]*wf[:,:,j].conj()*self.HS[:,j,i][:,None]
+            if i!=j:
+                e_ka = 2*e_ka.real
+        else:
+            raise NotImplementedError('Unknown covalent energy mode "%s".' %mode) 
             
-        for k,wk in enumerate(self.wk):
-            for a in range(self.norb):
-                if not mn<=energy[k,a]<=mx:
-                    continue 
-                x.append( energy[k,a] )
-                if mode == 'default':
-                    e = 0.0
-                    for m in range(self.norb):
-                        e += wk*np.sum( (wf[k,a,m]*wf[k,a,:].conj()*self.HS[k,:,m]) )
-                    y.append(e)
-                elif mode == 'orbitals':
-                    if i!=j:
-                        y.append( wk*2*(wf[k,a,i]*wf[k,a,j].conj()*self.HS[k,j,i]).real )
-                    else:
-                        y.append( wk*wf[k,a,i]*wf[k,a,j].conj()*self.HS[k,j,i])
-                elif mode == 'atoms':
-                    e = 0.0
-                    if i!=j:
-                        for m in range(o1i,o1i+noi):
-                            for n in range(o1j,o1j+noj):
-                                e += wk*2*(wf[k,a,m]*wf[k,a,n].conj()*self.HS[k,n,m]).real
-                    else:
-                        for m in range(o1i,o1i+noi):
-                            for n in range(o1j,o1j+noj):
-                                e += wk*(wf[k,a,m]*wf[k,a,n].conj()*self.HS[k,n,m])
-                    y.append(e)
-                elif mode == 'angmom':
-                    e = 0.0                                
-                    for m in lorbs[i]:                           
-                        e += wk*np.sum( wf[k,a,m]*wf[k,a,oj].conj()*self.HS[k,oj,m] )
-                    if i!=j:
-                        e += e.conj()
-                    y.append(e)
-                else:
-                    raise NotImplementedError('Unknown covalent energy mode "%s".' %mode) 
-                    
-        x,y = np.array(x), np.array(y)
-        assert np.all( abs(y.imag)<1E-12 )
+        # only states within window
+        kl, al = np.where( (mn<=energy) & (energy<=mx) )
+        x = energy[kl,al]
+        y = self.wk[kl]*e_ka[kl,al]
+        assert np.all( abs(y.imag)<self.tol_imaginary )
         y=y.real
         if width==None:
             return x * Hartree, y * Hartree
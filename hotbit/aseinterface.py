@@ -170,7 +170,8 @@ class Hotbit(Output):
                      'tol_imaginary_e': 1E-13,     # tolerance for imaginary band energy
                      'tol_mulliken':1E-5,          # tolerance for mulliken charge sum deviation from integer
                      'tol_eigenvector_norm':1E-6, # tolerance for eigenvector norm for eigensolver
-                     'symop_range':5}              # range for the number of symmetry operations in all symmetries
+                     'symop_range':5,              # range for the number of symmetry operations in all symmetries
+                     'gpu':False}                  # use CuPy (cuBLAS) for the k-point batched matrix products in bonding analysis
         internal0.update(internal)
         for key in internal0:
             self.set(key,internal0[key])
@@ -999,7 +1000,7 @@ class Hotbit(Output):
 
 
 
-    def get_mayer_bond_order(self,i,j):
+    def get_mayer_bond_order(self,i,j,check_imaginary=True):
         """
         Return Mayer bond-order between two atoms.
 
@@ -1008,11 +1009,31 @@ class Hotbit(Output):
 
         parameters:
         ===========
-        I:        first atom index
-        J:        second atom index
+        I:               first atom index
+        J:               second atom index
+        check_imaginary: assert that the imaginary part is negligible;
+                         if False, the imaginary part is discarded
         """
         self._init_bonds()
-        return self.bonds.get_mayer_bond_order(i,j)
+        return self.bonds.get_mayer_bond_order(i,j,check_imaginary)
+
+
+    def get_mayer_bond_order_matrix(self,check_imaginary=True):
+        """
+        Return Mayer bond-orders between all atom pairs.
+
+        Warning: appears to work only with periodic systems
+        where orbitals have no overlap with own images.
+
+        parameters:
+        ===========
+        check_imaginary: assert that the imaginary parts of all elements
+                         are negligible; if False, they are discarded
+
+        return:   array M[i,j], the bond-order between atoms i and j
+        """
+        self._init_bonds()
+        return self.bonds.get_mayer_bond_order_matrix(check_imaginary)
 
 
     def get_promotion_energy(self,I=None):
@@ -193,6 +193,15 @@ if True:
     atoms.set_calculator(calc)
     atoms.get_potential_energy()
     assert abs(calc.get_mayer_bond_order(1,2)-1.24155188722)<eps
+    # some distant pairs have imaginary parts beyond tolerance here
+    try:
+        calc.get_mayer_bond_order_matrix()
+        raise RuntimeError('Imaginary parts should not pass the check.')
+    except AssertionError:
+        pass
+    M = calc.get_mayer_bond_order_matrix(check_imaginary=False)
+    assert abs(M[1,2]-1.24155188722)<eps
+    assert all(abs(M-M.transpose())<eps)
     assert abs(calc.get_atom_energy(0)-6.95260830265)<eps
     assert abs(calc.get_atom_and_bond_energy(0)--9.62628777865)<eps
     assert abs(calc.get_promotion_energy(0)-6.95260830265)<eps
@@ -272,6 +281,42 @@ if True:
     assert abs(ABC--9.62578724411)<eps
     
 
+if True:
+    #
+    # single precision analysis should agree with the default one
+    #
+    from hotbit.analysis import MullikenBondAnalysis
+    atoms = graphene(2,2,1.42)
+    calc = Hotbit(SCC=False,kpts=(2,2,1),txt='-',**default_param)
+    atoms.set_calculator(calc)
+    atoms.get_potential_energy()
+    b1 = MullikenBondAnalysis(calc)
+    b2 = MullikenBondAnalysis(calc,dtype=complex64)
+    assert b2.rhoM.dtype==complex64
+    assert all(abs(b1.get_atom_energy()-b2.get_atom_energy())<1E-4)
+    for mode,i,j in [('default',None,None),('atoms',0,1),('atoms',1,1),('angmom',0,1),('angmom',1,1)]:
+        x1,y1 = b1.get_covalent_energy(mode,i,j)
+        x2,y2 = b2.get_covalent_energy(mode,i,j)
+        assert all(abs(y1-y2)<1E-4)
+    
+    # projected LDOS with d-orbitals
+    from hotbit.analysis import DensityOfStates
+    atoms = Atoms('Au2',positions=[(0,0,0),(1.6,1.2,0.2)],cell=(10,10,10),pbc=False)
+    atoms.center(vacuum=10)
+    calc = Hotbit(SCC=True,txt='-',**default_param)
+    atoms.set_calculator(calc)
+    atoms.get_potential_energy()
+    d1 = DensityOfStates(calc)
+    d2 = DensityOfStates(calc,dtype=complex64)
+    e1,ldos1,pldos1 = d1.get_local_density_of_states(projected=True,width=0.01)
+    e2,ldos2,pldos2 = d2.get_local_density_of_states(projected=True,width=0.01)
+    assert abs(ldos1-ldos2).max()<1E-4*abs(ldos1).max()
+    assert abs(pldos1-pldos2).max()<1E-4*abs(pldos1).max()
+    x1,y1 = MullikenBondAnalysis(calc).get_covalent_energy('angmom',2,2)
+    x2,y2 = MullikenBondAnalysis(calc,dtype=complex64).get_covalent_energy('angmom',2,2)
+    assert all(abs(y1-y2)<1E-4)
+    
+
   
 
     